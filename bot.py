@@ -1,98 +1,240 @@
 import os
 import json
+import re
+import asyncio
+import atexit
+from concurrent.futures import ThreadPoolExecutor
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import RetryAfter
 from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, ContextTypes, filters
 from pathlib import Path
 import logging
 
+__all__ = ["main"]
+
+# orjson is optional; fall back to the stdlib json module without it
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # Setup logging
 logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Get variables from Railway
-BOT_TOKEN = os.environ["BOT_TOKEN"]  # Required - get from Railway
+# Get variables from Railway (BOT_TOKEN is required and read in main())
 ADMIN_IDS = json.loads(os.environ.get("ADMIN_IDS", "[]"))  # Your Telegram ID
 
+# Static admin menu, built once and reused on every /start
+ADMIN_PANEL_TEXT = "👑 Admin Panel"
+NOT_AUTHORIZED_TEXT = "❌ Not authorized"
+ADD_CHANNEL_TEXT = "Send me channel @username or forward message from channel"
+BROADCAST_TEXT = "Send message to broadcast to all channels"
+NO_CHANNELS_TEXT = "No channels added"
+INVALID_CHANNEL_TEXT = "❌ Send a valid @username or forward a message from the channel"
+ADMIN_MENU_MARKUP = InlineKeyboardMarkup([
+    [InlineKeyboardButton("➕ Add Channel", callback_data="add")],
+    [InlineKeyboardButton("📢 Broadcast", callback_data="broadcast")],
+    [InlineKeyboardButton("📋 List Channels", callback_data="list")]
+])
+
+# Max concurrent sends during a broadcast (stay under Telegram rate limits)
+BROADCAST_CONCURRENCY = 20
+broadcast_semaphore = asyncio.Semaphore(BROADCAST_CONCURRENCY)
+# Flood-control retries per channel; longer waits count as a failed send
+BROADCAST_MAX_RETRIES = 3
+BROADCAST_MAX_RETRY_WAIT = 30
+
+# A channel typed by hand: a valid Telegram @username (4-32 chars,
+# so short collectible usernames are accepted too)
+CHANNEL_REF_RE = re.compile(r"@[A-Za-z][A-Za-z0-9_]{3,31}")
+
 # Database file
 db_file = Path("broadcast_data.json")
 
-# Load database
-if db_file.exists():
-    with open(db_file, 'r') as f:
-        data = json.load(f)
-else:
-    data = {"channels": [], "admins": ADMIN_IDS, "stats": {"total": 0}}
+# Database, filled in by load_db() so importing this module does no I/O
+data = {}
+
+# Lookup indexes mirroring data["admins"] and data["channels"]
+admin_set = set()
+channels_by_id = {}
+
+def load_db():
+    if db_file.exists():
+        raw = db_file.read_bytes()
+        data.update(orjson.loads(raw) if orjson else json.loads(raw))
+    else:
+        data.update({"channels": [], "admins": ADMIN_IDS, "stats": {"total": 0}})
+    admin_set.update(data["admins"])
+    # Channel ids are kept as strings so lookups need no conversion;
+    # usernames are case-insensitive, so they are stored lowercased and
+    # case-only duplicates from older files are dropped
+    channels = []
+    for c in data["channels"]:
+        c["id"] = str(c["id"])
+        if c["id"].startswith("@"):
+            c["id"] = c["id"].lower()
+        if c["id"] not in channels_by_id:
+            channels_by_id[c["id"]] = c
+            channels.append(c)
+    data["channels"] = channels
+
+# Writes are debounced: save_db() only marks the data dirty and
+# flush_db() persists it every DB_FLUSH_INTERVAL seconds
+DB_FLUSH_INTERVAL = 2
+db_dirty = False
+# Single worker keeps file writes off the event loop and in order
+db_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-io")
 
 def save_db():
-    with open(db_file, 'w') as f:
-        json.dump(data, f, indent=2)
+    global db_dirty
+    db_dirty = True
+
+def dump_db():
+    if orjson:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2)
+    return json.dumps(data, indent=2).encode()
+
+def write_payload(payload):
+    # Write to a temp file and swap it in so a crash can't truncate the db
+    tmp_file = db_file.with_suffix('.tmp')
+    tmp_file.write_bytes(payload)
+    tmp_file.replace(db_file)
+
+def write_db():
+    global db_dirty
+    if not db_dirty:
+        return
+    db_dirty = False
+    try:
+        write_payload(dump_db())
+    except Exception:
+        db_dirty = True
+        raise
+
+async def flush_db(context: ContextTypes.DEFAULT_TYPE):
+    global db_dirty
+    if not db_dirty:
+        return
+    db_dirty = False
+    # Serialize on the event loop so the snapshot is consistent,
+    # then hand the disk write to the db-io thread
+    try:
+        payload = dump_db()
+        await asyncio.get_running_loop().run_in_executor(db_executor, write_payload, payload)
+    except Exception as e:
+        # Keep the changes pending so the next flush retries them
+        db_dirty = True
+        logger.error(f"Saving database failed: {e}")
+
+# Rendered channel list, rebuilt only after the channels change
+channel_list_text = None
+
+def get_channel_list_text():
+    global channel_list_text
+    if channel_list_text is None:
+        channels = data["channels"]
+        if channels:
+            channel_list_text = "📋 Channels:\n" + "\n".join([f"• {c['title']}" for c in channels])
+        else:
+            channel_list_text = NO_CHANNELS_TEXT
+    return channel_list_text
 
 # ========== BOT FUNCTIONS ==========
+async def send_one(bot, chat_id, from_chat_id, message_id):
+    async with broadcast_semaphore:
+        for attempt in range(1, BROADCAST_MAX_RETRIES + 1):
+            try:
+                await bot.copy_message(
+                    chat_id=chat_id,
+                    from_chat_id=from_chat_id,
+                    message_id=message_id
+                )
+                return True
+            except RetryAfter as e:
+                if attempt == BROADCAST_MAX_RETRIES or e.retry_after > BROADCAST_MAX_RETRY_WAIT:
+                    logger.warning(f"Broadcast to {chat_id} failed: flood control, retry after {e.retry_after}s")
+                    return False
+                # Flood control: wait as long as Telegram asks, then resend
+                logger.info(f"Broadcast to {chat_id} throttled, retrying in {e.retry_after}s")
+                await asyncio.sleep(e.retry_after)
+            except Exception as e:
+                logger.warning(f"Broadcast to {chat_id} failed: {e}")
+                return False
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if update.effective_user.id in data["admins"]:
-        keyboard = [
-            [InlineKeyboardButton("➕ Add Channel", callback_data="add")],
-            [InlineKeyboardButton("📢 Broadcast", callback_data="broadcast")],
-            [InlineKeyboardButton("📋 List Channels", callback_data="list")]
-        ]
+    if update.effective_user.id in admin_set:
         await update.message.reply_text(
-            "👑 Admin Panel",
-            reply_markup=InlineKeyboardMarkup(keyboard)
+            ADMIN_PANEL_TEXT,
+            reply_markup=ADMIN_MENU_MARKUP
         )
     else:
-        await update.message.reply_text("❌ Not authorized")
+        await update.message.reply_text(NOT_AUTHORIZED_TEXT)
+
+async def prompt_add(query, context: ContextTypes.DEFAULT_TYPE):
+    await query.edit_message_text(ADD_CHANNEL_TEXT)
+    context.user_data["adding"] = True
+
+async def prompt_broadcast(query, context: ContextTypes.DEFAULT_TYPE):
+    await query.edit_message_text(BROADCAST_TEXT)
+    context.user_data["broadcasting"] = True
+
+async def list_channels(query, context: ContextTypes.DEFAULT_TYPE):
+    await query.edit_message_text(get_channel_list_text())
+
+# Callback data -> handler for the admin menu buttons
+BUTTON_HANDLERS = {
+    "add": prompt_add,
+    "broadcast": prompt_broadcast,
+    "list": list_channels,
+}
 
 async def button_click(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     
-    if query.data == "add":
-        await query.edit_message_text("Send me channel @username or forward message from channel")
-        context.user_data["adding"] = True
-    elif query.data == "broadcast":
-        await query.edit_message_text("Send message to broadcast to all channels")
-        context.user_data["broadcasting"] = True
-    elif query.data == "list":
-        channels = data["channels"]
-        if channels:
-            text = "📋 Channels:\n" + "\n".join([f"• {c['title']}" for c in channels])
-        else:
-            text = "No channels added"
-        await query.edit_message_text(text)
+    handler = BUTTON_HANDLERS.get(query.data)
+    if handler:
+        await handler(query, context)
 
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if update.effective_user.id not in data["admins"]:
+    global channel_list_text
+    if update.effective_user.id not in admin_set:
         return
     
     if context.user_data.get("adding"):
         channel_id = None
         if update.message.forward_from_chat:
-            channel_id = update.message.forward_from_chat.id
+            channel_id = str(update.message.forward_from_chat.id)
             title = update.message.forward_from_chat.title
-        elif update.message.text and update.message.text.startswith("@"):
-            channel_id = update.message.text
+        elif update.message.text and CHANNEL_REF_RE.fullmatch(update.message.text):
+            channel_id = update.message.text.lower()
             title = update.message.text
         
         if channel_id:
-            data["channels"].append({"id": channel_id, "title": title})
-            save_db()
-            await update.message.reply_text(f"✅ Added: {title}")
+            if channel_id in channels_by_id:
+                await update.message.reply_text(f"⚠️ Already added: {title}")
+            else:
+                channel = {"id": channel_id, "title": title}
+                data["channels"].append(channel)
+                channels_by_id[channel_id] = channel
+                channel_list_text = None
+                save_db()
+                await update.message.reply_text(f"✅ Added: {title}")
+        else:
+            await update.message.reply_text(INVALID_CHANNEL_TEXT)
         
         context.user_data.pop("adding", None)
     
     elif context.user_data.get("broadcasting"):
         channels = data["channels"]
-        success = 0
-        for channel in channels:
-            try:
-                await context.bot.copy_message(
-                    chat_id=channel["id"],
-                    from_chat_id=update.message.chat_id,
-                    message_id=update.message.message_id
-                )
-                success += 1
-            except:
-                pass
+        bot = context.bot
+        src_chat = update.message.chat_id
+        src_msg = update.message.message_id
+        results = await asyncio.gather(
+            *(send_one(bot, channel["id"], src_chat, src_msg) for channel in channels)
+        )
+        success = sum(results)
         
         data["stats"]["total"] += 1
         save_db()
@@ -100,7 +242,11 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         context.user_data.pop("broadcasting", None)
 
 def main():
-    app = Application.builder().token(BOT_TOKEN).build()
+    load_db()
+    app = Application.builder().token(os.environ["BOT_TOKEN"]).build()
+    
+    app.job_queue.run_repeating(flush_db, interval=DB_FLUSH_INTERVAL)
+    atexit.register(write_db)
     
     app.add_handler(CommandHandler("start", start))
     app.add_handler(CallbackQueryHandler(button_click))